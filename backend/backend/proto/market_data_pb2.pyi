@@ -70,16 +70,24 @@ class OrderBookUpdate(_message.Message):
     timestamp: float
     def __init__(self, instrument_id: _Optional[str] = ..., price: _Optional[float] = ..., quantity: _Optional[int] = ..., side: bool = ..., timestamp: _Optional[float] = ...) -> None: ...
 
+class OrderBookUpdateBatch(_message.Message):
+    __slots__ = ("updates",)
+    UPDATES_FIELD_NUMBER: _ClassVar[int]
+    updates: _containers.RepeatedCompositeFieldContainer[OrderBookUpdate]
+    def __init__(self, updates: _Optional[_Iterable[_Union[OrderBookUpdate, _Mapping]]] = ...) -> None: ...
+
 class SubscriptionRequest(_message.Message):
-    __slots__ = ("instrument_id",)
-    INSTRUMENT_ID_FIELD_NUMBER: _ClassVar[int]
-    instrument_id: str
-    def __init__(self, instrument_id: _Optional[str] = ...) -> None: ...
+    __slots__ = ("instrument_ids",)
+    INSTRUMENT_IDS_FIELD_NUMBER: _ClassVar[int]
+    instrument_ids: _containers.RepeatedScalarFieldContainer[str]
+    def __init__(self, instrument_ids: _Optional[_Iterable[str]] = ...) -> None: ...
 
 class MarketDataResponse(_message.Message):
-    __slots__ = ("snapshot", "update")
+    __slots__ = ("snapshot", "update", "batch")
     SNAPSHOT_FIELD_NUMBER: _ClassVar[int]
     UPDATE_FIELD_NUMBER: _ClassVar[int]
+    BATCH_FIELD_NUMBER: _ClassVar[int]
     snapshot: OrderBookSnapshot
     update: OrderBookUpdate
-    def __init__(self, snapshot: _Optional[_Union[OrderBookSnapshot, _Mapping]] = ..., update: _Optional[_Union[OrderBookUpdate, _Mapping]] = ...) -> None: ...
+    batch: OrderBookUpdateBatch
+    def __init__(self, snapshot: _Optional[_Union[OrderBookSnapshot, _Mapping]] = ..., update: _Optional[_Union[OrderBookUpdate, _Mapping]] = ..., batch: _Optional[_Union[OrderBookUpdateBatch, _Mapping]] = ...) -> None: ...
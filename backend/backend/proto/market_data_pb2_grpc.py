@@ -48,7 +48,7 @@ class MarketDataServiceServicer(object):
 
     def SubscribeMarketData(self, request, context):
         """A server-streaming RPC. Client sends one request, server sends a stream of responses.
-        The first message will be a snapshot, followed by incremental updates.
+        The first messages will be a snapshot per requested instrument, followed by incremental updates.
         """
         context.set_code(grpc.StatusCode.UNIMPLEMENTED)
         context.set_details('Method not implemented!')
@@ -4,53 +4,93 @@ from .market_data_pb2_generated import market_data_pb2 as pb2
 from .market_data_pb2_generated import market_data_pb2_grpc as pb2_grpc
 import asyncio
 import grpc
-import random, time
+import sys
+import time
+from typing import Dict, Iterable, List
 from .market_data_model import ClientOrderBook
 
 SERVER_ADDRESS = 'localhost:50051'
+GRPC_CHANNEL_OPTIONS = [
+    ("grpc.keepalive_time_ms", 20000),
+    ("grpc.keepalive_permit_without_calls", 1),
+    ("grpc.http2.max_pings_without_data", 0),
+    ("grpc.http2.bdp_probe", 1), # Let flow-control windows grow beyond the 64 KiB default
+    ("grpc.http2.write_buffer_size", 1 << 20),
+    ("grpc.max_receive_message_length", -1),
+]
+# Rendering full books is only useful on a terminal; skip it when output is redirected
+RENDER_BOOKS = sys.stdout.isatty()
+# Redraw each instrument's book at most this often; updates in between only touch the in-memory book
+RENDER_INTERVAL_SECONDS = 0.1
 
-async def subscribe_to_market_data(instrument_id: str):
-    # Initialize a ClientOrderBook for this specific instrument
-    client_order_book = ClientOrderBook(instrument_id)
+def render_books(client_order_books: Iterable[ClientOrderBook], last_render: Dict[str, float], force: bool = False):
+    """Writes the books that are due for a redraw in a single stdout write and flush."""
+    if not RENDER_BOOKS:
+        return
+    now = time.monotonic()
+    output = []
+    for client_order_book in client_order_books:
+        instrument_id = client_order_book.instrument_id
+        if force or now - last_render.get(instrument_id, 0.0) >= RENDER_INTERVAL_SECONDS:
+            output.append(client_order_book.display_book())
+            last_render[instrument_id] = now
+    if output:
+        sys.stdout.write("".join(output))
+        sys.stdout.flush()
 
-    async with grpc.aio.insecure_channel(SERVER_ADDRESS) as channel:
-        stub = pb2_grpc.MarketDataServiceStub(channel)
-        print(f"CLI Client for {instrument_id}: Subscribing to market data...")
-        
-        request = pb2.market_data_pb2.SubscriptionRequest(instrument_id=instrument_id) # Refer to pb2 via its full path
-        
-        try:
-            response_iterator = stub.SubscribeMarketData(request)
-            async for response in response_iterator:
-                if response.HasField('snapshot'):
-                    snapshot_data = response.snapshot
-                    client_order_book.apply_snapshot(snapshot_data)
-                    print(client_order_book.display_book())
+async def subscribe_to_market_data(instrument_ids: List[str], channel: grpc.aio.Channel):
+    # Initialize a ClientOrderBook per instrument; responses are dispatched by their instrument_id
+    client_order_books: Dict[str, ClientOrderBook] = {
+        instrument_id: ClientOrderBook(instrument_id) for instrument_id in instrument_ids
+    }
+    last_render: Dict[str, float] = {}
 
-                elif response.HasField('update'):
-                    update_data = response.update
+    stub = pb2_grpc.MarketDataServiceStub(channel)
+    print(f"CLI Client: Subscribing to market data for {len(instrument_ids)} instruments...")
+
+    request = pb2.SubscriptionRequest(instrument_ids=instrument_ids)
+
+    try:
+        response_iterator = stub.SubscribeMarketData(request)
+        async for response in response_iterator:
+            if response.HasField('snapshot'):
+                snapshot_data = response.snapshot
+                client_order_book = client_order_books[snapshot_data.instrument_id]
+                client_order_book.apply_snapshot(snapshot_data)
+                render_books([client_order_book], last_render, force=True)
+
+            elif response.HasField('update'):
+                update_data = response.update
+                client_order_book = client_order_books[update_data.instrument_id]
+                client_order_book.apply_update(update_data)
+                render_books([client_order_book], last_render)
+
+            elif response.HasField('batch'):
+                updated_books = {}
+                for update_data in response.batch.updates:
+                    instrument_id = update_data.instrument_id
+                    client_order_book = client_order_books[instrument_id]
                     client_order_book.apply_update(update_data)
-                    
-                    print(f"CLI Client for {instrument_id}: Applied update {update_data.price:.2f}@{update_data.quantity} ({'BUY' if update_data.side else 'SELL'})")
-                    print(client_order_book.display_book())
+                    updated_books[instrument_id] = client_order_book
+                render_books(updated_books.values(), last_render)
 
-                else:
-                    print(f"CLI Client for {instrument_id}: Received MarketDataResponse with no recognized field set.")
-        
-        except grpc.aio.AioRpcError as e:
-            print(f"CLI Client for {instrument_id}: RPC Error occurred: {e.code()} - {e.details()}")
-            if e.code() == grpc.StatusCode.UNAVAILABLE:
-                print(f"CLI Client for {instrument_id}: Server is unavailable. Make sure the server is running.")
-            elif e.code() == grpc.StatusCode.CANCELLED:
-                print(f"CLI Client for {instrument_id}: Stream cancelled by client or server.")
-            elif e.code() == grpc.StatusCode.DEADLINE_EXCEEDED:
-                print(f"CLI Client for {instrument_id}: Operation timed out.")
             else:
-                print(f"CLI Client for {instrument_id}: An unexpected gRPC error occurred: {e}")
-        except asyncio.CancelledError:
-            print(f"CLI Client task for {instrument_id} was cancelled (e.g., by KeyboardInterrupt).")
-        except Exception as e:
-            print(f"CLI Client for {instrument_id}: An unexpected error occurred in client stream: {e}")
+                print("CLI Client: Received MarketDataResponse with no recognized field set.")
+
+    except grpc.aio.AioRpcError as e:
+        print(f"CLI Client: RPC Error occurred: {e.code()} - {e.details()}")
+        if e.code() == grpc.StatusCode.UNAVAILABLE:
+            print("CLI Client: Server is unavailable. Make sure the server is running.")
+        elif e.code() == grpc.StatusCode.CANCELLED:
+            print("CLI Client: Stream cancelled by client or server.")
+        elif e.code() == grpc.StatusCode.DEADLINE_EXCEEDED:
+            print("CLI Client: Operation timed out.")
+        else:
+            print(f"CLI Client: An unexpected gRPC error occurred: {e}")
+    except asyncio.CancelledError:
+        print("CLI Client task was cancelled (e.g., by KeyboardInterrupt).")
+    except Exception as e:
+        print(f"CLI Client: An unexpected error occurred in client stream: {e}")
 
 async def main():
     # Make sure this list matches SIMULATED_INSTRUMENTS in the server for full testing
@@ -59,16 +99,12 @@ async def main():
                                  "TRX_USD","NEAR_USD","ETC_USD","FIL_USD","APT_USD","ARB_USD","SUI_USD",
                                  "INJ_USD","OP_USD","PEPE_USD","FTM_USD","ALGO_USD","GRT_USD","IMX_USD",
                                  "AAVE_USD","SNX_USD"]
-    
-    tasks = []
-    print("Starting CLI client subscriptions...")
-    for instrument_id in instruments_to_subscribe:
-        tasks.append(asyncio.create_task(subscribe_to_market_data(instrument_id)))
-        # Stagger subscription initiation
-        await asyncio.sleep(random.uniform(0.3, 1.5))
-        
-    await asyncio.gather(*tasks)
-            
+
+    print("Starting CLI client subscription...")
+    # A single server-streaming call carries every instrument
+    async with grpc.aio.insecure_channel(SERVER_ADDRESS, options=GRPC_CHANNEL_OPTIONS) as channel:
+        await subscribe_to_market_data(instruments_to_subscribe, channel)
+
 if __name__ == '__main__':    
     try:
         # NOTE: Make sure the gRPC server (market_data_server.py) is running before starting this client.
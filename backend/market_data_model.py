@@ -1,23 +1,45 @@
 # backend/market_data_model.py
-import heapq
+from itertools import islice
+from operator import neg
 from typing import Dict, List, Tuple, Optional
 
+from sortedcontainers import SortedDict
+
 # Import generated protobuf types if needed for type hinting, though not strictly required for the class itself
 # from .market_data_pb2_generated import market_data_pb2 as pb2
 
+# Price levels are keyed by integer ticks (price * tick scale) rather than float prices.
+# Feeds quote to a fixed tick size, so this is exact and keeps hashing/comparisons on ints.
+DEFAULT_TICK_SCALE = 100
+# Per-instrument overrides for instruments quoted with finer ticks, e.g. {"PEPE_USD": 10**8}
+INSTRUMENT_TICK_SCALES: Dict[str, int] = {}
 
 class ClientOrderBook:
     """
     Maintains a local, in-memory representation of an order book for a single instrument.
     This class is reusable by different clients (CLI, Web).
     """
-    def __init__(self, instrument_id: str):
+    _SEPARATOR = "-" * 50
+
+    def __init__(self, instrument_id: str, tick_scale: Optional[int] = None):
         self.instrument_id = instrument_id
-        self.bids: Dict[float, int] = {}
-        self._bid_heap: List[Tuple[float, float]] = [] # (-price, price)
-        self.asks: Dict[float, int] = {}
-        self._ask_heap: List[Tuple[float, float]] = [] # (price, price)
+        self.tick_scale: int = tick_scale or INSTRUMENT_TICK_SCALES.get(instrument_id, DEFAULT_TICK_SCALE)
+        # Tick -> quantity, kept sorted best-first: bids by descending price, asks ascending
+        self.bids: SortedDict = SortedDict(neg)
+        self.asks: SortedDict = SortedDict()
         self.last_update_timestamp: float = 0.0
+        # Bumped on every snapshot/update so consumers can cache anything derived from the book
+        self.version: int = 0
+
+        # Memoized top-of-book views, rebuilt only after the corresponding side changes
+        self._dirty_bid: bool = True
+        self._dirty_ask: bool = True
+        self._cached_bids: List[Tuple[float, int]] = []
+        self._cached_asks: List[Tuple[float, int]] = []
+        self._cached_bids_depth: int = 0
+        self._cached_asks_depth: int = 0
+        self._timestamp_str_for: Optional[float] = None
+        self._timestamp_str: str = ""
 
     # Note: For apply_snapshot and apply_update, you'll need to pass the protobuf messages
     # as arguments. I'll include type hints assuming you pass the raw protobuf objects.
@@ -31,90 +53,128 @@ class ClientOrderBook:
         """
         self.bids.clear()
         self.asks.clear()
-        self._bid_heap = []
-        self._ask_heap = []
-
-        for level in snapshot.bids:
-            self.bids[level.price] = level.quantity
-            heapq.heappush(self._bid_heap, (-level.price, level.price))
-
-        for level in snapshot.asks:
-            self.asks[level.price] = level.quantity
-            heapq.heappush(self._ask_heap, (level.price, level.price))
+        # Bulk-load each side: SortedDict.update sorts the new keys once instead of
+        # inserting level by level
+        self.bids.update(self._level_ticks(snapshot.bids))
+        self.asks.update(self._level_ticks(snapshot.asks))
 
+        self._dirty_bid = True
+        self._dirty_ask = True
+        self.version += 1
         self.last_update_timestamp = snapshot.timestamp
 
+    def _level_ticks(self, levels) -> List[Tuple[int, int]]:
+        """Extracts (tick, quantity) pairs with positive quantity from repeated pb2.OrderBookLevel."""
+        tick_scale = self.tick_scale
+        return [
+            (round(price * tick_scale), quantity)
+            for price, quantity in ((level.price, level.quantity) for level in levels)
+            if quantity > 0
+        ]
+
     def apply_update(self, update): # type: (Any) -> None # Using Any for protobuf for simplicity here
         """
         Applies an incremental order book update.
         Expects a pb2.OrderBookUpdate object.
         """
-        target_dict = self.bids if update.side else self.asks
-        target_heap = self._bid_heap if update.side else self._ask_heap
+        # Read each protobuf field once
+        side = update.side
+        quantity = update.quantity
+        target_dict = self.bids if side else self.asks
+        tick = round(update.price * self.tick_scale)
+
+        if quantity > 0:
+            target_dict[tick] = quantity
+        else:
+            target_dict.pop(tick, None)
 
-        if update.quantity > 0:
-            if update.price not in target_dict:
-                heapq.heappush(target_heap, (-update.price, update.price) if update.side else (update.price, update.price))
-            target_dict[update.price] = update.quantity
+        if side:
+            self._dirty_bid = True
         else:
-            if update.price in target_dict:
-                del target_dict[update.price]
+            self._dirty_ask = True
+        self.version += 1
         self.last_update_timestamp = update.timestamp
 
     def get_best_bid(self) -> Tuple[Optional[float], Optional[int]]:
-        while self._bid_heap:
-            _, price = self._bid_heap[0]
-            if price in self.bids and self.bids[price] > 0:
-                return price, self.bids[price]
-            heapq.heappop(self._bid_heap)
+        if self.bids:
+            tick, quantity = self.bids.peekitem(0)
+            return tick / self.tick_scale, quantity
         return None, None
 
     def get_best_ask(self) -> Tuple[Optional[float], Optional[int]]:
-        while self._ask_heap:
-            _, price = self._ask_heap[0]
-            if price in self.asks and self.asks[price] > 0:
-                return price, self.asks[price]
-            heapq.heappop(self._ask_heap)
+        if self.asks:
+            tick, quantity = self.asks.peekitem(0)
+            return tick / self.tick_scale, quantity
         return None, None
 
+    def _top(self, side: bool, n: int) -> List[Tuple[float, int]]:
+        """
+        Returns the best N (price, quantity) levels for one side (True for bids, False for asks).
+        Both sides are already sorted best-first and only hold positive quantities, so this is a
+        slice; the result is cached until the side changes or a deeper view is requested.
+        """
+        if side:
+            if self._dirty_bid or self._cached_bids_depth < n:
+                tick_scale = self.tick_scale
+                self._cached_bids = [(t / tick_scale, q) for t, q in islice(self.bids.items(), n)]
+                self._cached_bids_depth = n
+                self._dirty_bid = False
+            return self._cached_bids[:n]
+
+        if self._dirty_ask or self._cached_asks_depth < n:
+            tick_scale = self.tick_scale
+            self._cached_asks = [(t / tick_scale, q) for t, q in islice(self.asks.items(), n)]
+            self._cached_asks_depth = n
+            self._dirty_ask = False
+        return self._cached_asks[:n]
+
     def get_top_n_levels_list(self, n=5) -> Tuple[List[Dict], List[Dict]]:
         """
         Returns the top N bid and ask levels as sorted lists of dictionaries 
         (e.g., [{"price": p, "quantity": q}, ...]).
         """
-        # Ensure quantities are positive before sorting
-        sorted_bids = sorted([ (p, q) for p, q in self.bids.items() if q > 0 ], key=lambda x: x[0], reverse=True)[:n]
-        sorted_asks = sorted([ (p, q) for p, q in self.asks.items() if q > 0 ], key=lambda x: x[0])[:n]
-        
         # Convert to list of dicts for easier JSON serialization
-        bids_dicts = [{"price": p, "quantity": q} for p, q in sorted_bids]
-        asks_dicts = [{"price": p, "quantity": q} for p, q in sorted_asks]
-        
+        bids_dicts = [{"price": p, "quantity": q} for p, q in self._top(True, n)]
+        asks_dicts = [{"price": p, "quantity": q} for p, q in self._top(False, n)]
+
         return bids_dicts, asks_dicts
 
+    def _formatted_timestamp(self) -> str:
+        """Returns last_update_timestamp formatted for display, reformatting only when it changes."""
+        if self._timestamp_str_for != self.last_update_timestamp:
+            self._timestamp_str = f"{self.last_update_timestamp:.2f}"
+            self._timestamp_str_for = self.last_update_timestamp
+        return self._timestamp_str
+
     def display_book(self):
         """Prints a formatted view of the order book for CLI display."""
         best_bid_price, best_bid_qty = self.get_best_bid()
         best_ask_price, best_ask_qty = self.get_best_ask()
-        
-        bids_list, asks_list = self.get_top_n_levels_list(n=5) # Get top 5 levels for CLI
-        
-        display_str = f"\n--- {self.instrument_id} Order Book (Timestamp: {self.last_update_timestamp:.2f}) ---\n"
-        display_str += f"Best Bid: {best_bid_price:.2f} @ {best_bid_qty} | Best Ask: {best_ask_price:.2f} @ {best_ask_qty}\n"
-        display_str += "--------------------------------------------------\n"
-        
-        display_str += "Asks:\n"
-        for level in reversed(asks_list): # Reverse for display: highest price first for asks
-            display_str += f"  {level['price']:10.2f} {level['quantity']:>10}\n"
-        
-        display_str += "--------------------------------------------------\n"
-        display_str += "Bids:\n"
-        for level in bids_list:
-            display_str += f"  {level['price']:10.2f} {level['quantity']:>10}\n"
-        
-        display_str += "--------------------------------------------------\n"
-        return display_str
-    
+        best_bid_str = f"{best_bid_price:.2f} @ {best_bid_qty}" if best_bid_price is not None else "N/A"
+        best_ask_str = f"{best_ask_price:.2f} @ {best_ask_qty}" if best_ask_price is not None else "N/A"
+
+        bids_list = self._top(True, 5) # Get top 5 levels for CLI
+        asks_list = self._top(False, 5)
+
+        parts = [
+            "",
+            f"--- {self.instrument_id} Order Book (Timestamp: {self._formatted_timestamp()}) ---",
+            f"Best Bid: {best_bid_str} | Best Ask: {best_ask_str}",
+            self._SEPARATOR,
+            "Asks:",
+        ]
+        for price, quantity in reversed(asks_list): # Reverse for display: highest price first for asks
+            parts.append(f"  {price:10.2f} {quantity:>10}")
+
+        parts.append(self._SEPARATOR)
+        parts.append("Bids:")
+        for price, quantity in bids_list:
+            parts.append(f"  {price:10.2f} {quantity:>10}")
+
+        parts.append(self._SEPARATOR)
+        parts.append("")
+        return "\n".join(parts)
+
     def to_dict(self) -> Dict:
         """Converts the current order book state to a dictionary for JSON serialization (web)."""
         bids_list, asks_list = self.get_top_n_levels_list(n=10) # Get more levels for web display
@@ -24,7 +24,7 @@ _sym_db = _symbol_database.Default()
 
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x11market_data.proto\x12\nmarketdata\"o\n\x05Order\x12\x10\n\x08order_id\x18\x01 \x01(\x03\x12\r\n\x05price\x18\x02 \x01(\x01\x12\x10\n\x08quantity\x18\x03 \x01(\x05\x12\x0c\n\x04side\x18\x04 \x01(\x08\x12\x12\n\norder_type\x18\x05 \x01(\t\x12\x11\n\ttimestamp\x18\x06 \x01(\x01\"h\n\x05Trade\x12\x14\n\x0c\x62uy_order_id\x18\x01 \x01(\x03\x12\x15\n\rsell_order_id\x18\x02 \x01(\x03\x12\r\n\x05price\x18\x03 \x01(\x01\x12\x10\n\x08quantity\x18\x04 \x01(\x05\x12\x11\n\ttimestamp\x18\x05 \x01(\x01\"1\n\x0eOrderBookLevel\x12\r\n\x05price\x18\x01 \x01(\x01\x12\x10\n\x08quantity\x18\x02 \x01(\x05\"\x91\x01\n\x11OrderBookSnapshot\x12\x15\n\rinstrument_id\x18\x01 \x01(\t\x12(\n\x04\x62ids\x18\x02 \x03(\x0b\x32\x1a.marketdata.OrderBookLevel\x12(\n\x04\x61sks\x18\x03 \x03(\x0b\x32\x1a.marketdata.OrderBookLevel\x12\x11\n\ttimestamp\x18\x04 \x01(\x01\"j\n\x0fOrderBookUpdate\x12\x15\n\rinstrument_id\x18\x01 \x01(\t\x12\r\n\x05price\x18\x02 \x01(\x01\x12\x10\n\x08quantity\x18\x03 \x01(\x05\x12\x0c\n\x04side\x18\x04 \x01(\x08\x12\x11\n\ttimestamp\x18\x05 \x01(\x01\",\n\x13SubscriptionRequest\x12\x15\n\rinstrument_id\x18\x01 \x01(\t\"\x82\x01\n\x12MarketDataResponse\x12\x31\n\x08snapshot\x18\x01 \x01(\x0b\x32\x1d.marketdata.OrderBookSnapshotH\x00\x12-\n\x06update\x18\x02 \x01(\x0b\x32\x1b.marketdata.OrderBookUpdateH\x00\x42\n\n\x08msg_type2o\n\x11MarketDataService\x12Z\n\x13SubscribeMarketData\x12\x1f.marketdata.SubscriptionRequest\x1a\x1e.marketdata.MarketDataResponse\"\x00\x30\x01\x62\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x11market_data.proto\x12\nmarketdata\"o\n\x05Order\x12\x10\n\x08order_id\x18\x01 \x01(\x03\x12\r\n\x05price\x18\x02 \x01(\x01\x12\x10\n\x08quantity\x18\x03 \x01(\x05\x12\x0c\n\x04side\x18\x04 \x01(\x08\x12\x12\n\norder_type\x18\x05 \x01(\t\x12\x11\n\ttimestamp\x18\x06 \x01(\x01\"h\n\x05Trade\x12\x14\n\x0c\x62uy_order_id\x18\x01 \x01(\x03\x12\x15\n\rsell_order_id\x18\x02 \x01(\x03\x12\r\n\x05price\x18\x03 \x01(\x01\x12\x10\n\x08quantity\x18\x04 \x01(\x05\x12\x11\n\ttimestamp\x18\x05 \x01(\x01\"1\n\x0eOrderBookLevel\x12\r\n\x05price\x18\x01 \x01(\x01\x12\x10\n\x08quantity\x18\x02 \x01(\x05\"\x91\x01\n\x11OrderBookSnapshot\x12\x15\n\rinstrument_id\x18\x01 \x01(\t\x12(\n\x04\x62ids\x18\x02 \x03(\x0b\x32\x1a.marketdata.OrderBookLevel\x12(\n\x04\x61sks\x18\x03 \x03(\x0b\x32\x1a.marketdata.OrderBookLevel\x12\x11\n\ttimestamp\x18\x04 \x01(\x01\"j\n\x0fOrderBookUpdate\x12\x15\n\rinstrument_id\x18\x01 \x01(\t\x12\r\n\x05price\x18\x02 \x01(\x01\x12\x10\n\x08quantity\x18\x03 \x01(\x05\x12\x0c\n\x04side\x18\x04 \x01(\x08\x12\x11\n\ttimestamp\x18\x05 \x01(\x01\"D\n\x14OrderBookUpdateBatch\x12,\n\x07updates\x18\x01 \x03(\x0b\x32\x1b.marketdata.OrderBookUpdate\"-\n\x13SubscriptionRequest\x12\x16\n\x0einstrument_ids\x18\x01 \x03(\t\"\xb5\x01\n\x12MarketDataResponse\x12\x31\n\x08snapshot\x18\x01 \x01(\x0b\x32\x1d.marketdata.OrderBookSnapshotH\x00\x12-\n\x06update\x18\x02 \x01(\x0b\x32\x1b.marketdata.OrderBookUpdateH\x00\x12\x31\n\x05\x62\x61tch\x18\x03 \x01(\x0b\x32 .marketdata.OrderBookUpdateBatchH\x00\x42\n\n\x08msg_type2o\n\x11MarketDataService\x12Z\n\x13SubscribeMarketData\x12\x1f.marketdata.SubscriptionRequest\x1a\x1e.marketdata.MarketDataResponse\"\x00\x30\x01\x62\x06proto3')
 
 _globals = globals()
 _builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
@@ -41,10 +41,12 @@ if not _descriptor._USE_C_DESCRIPTORS:
   _globals['_ORDERBOOKSNAPSHOT']._serialized_end=449
   _globals['_ORDERBOOKUPDATE']._serialized_start=451
   _globals['_ORDERBOOKUPDATE']._serialized_end=557
-  _globals['_SUBSCRIPTIONREQUEST']._serialized_start=559
-  _globals['_SUBSCRIPTIONREQUEST']._serialized_end=603
-  _globals['_MARKETDATARESPONSE']._serialized_start=606
-  _globals['_MARKETDATARESPONSE']._serialized_end=736
-  _globals['_MARKETDATASERVICE']._serialized_start=738
-  _globals['_MARKETDATASERVICE']._serialized_end=849
+  _globals['_ORDERBOOKUPDATEBATCH']._serialized_start=559
+  _globals['_ORDERBOOKUPDATEBATCH']._serialized_end=627
+  _globals['_SUBSCRIPTIONREQUEST']._serialized_start=629
+  _globals['_SUBSCRIPTIONREQUEST']._serialized_end=674
+  _globals['_MARKETDATARESPONSE']._serialized_start=677
+  _globals['_MARKETDATARESPONSE']._serialized_end=858
+  _globals['_MARKETDATASERVICE']._serialized_start=860
+  _globals['_MARKETDATASERVICE']._serialized_end=971
 # @@protoc_insertion_point(module_scope)
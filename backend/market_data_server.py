@@ -1,6 +1,6 @@
 #backend/market_data_server
-import grpc, time, concurrent.futures, random
-from .order_book import OrderBook, Order, Trade
+import grpc, time, concurrent.futures
+from .order_book import OrderBook, Order, Trade, TICK_SIZE, price_to_ticks
 from .market_data_pb2_generated import market_data_pb2 as pb2
 from .market_data_pb2_generated import market_data_pb2_grpc as pb2_grpc
 import asyncio
@@ -8,10 +8,30 @@ from collections import defaultdict, deque
 from typing import Optional, List
 from dataclasses import dataclass, field
 import threading
+import queue
+import itertools
+import numpy as np
+from numba import njit
 
 SERVER_ADDRESS = '[::]:50051'
 SIMULATION_INTERVAL_SECONDS = 0.1
 SIMULATION_ORDER_COUNT_PER_TICK = 1
+UPDATE_FLUSH_INTERVAL_SECONDS = 0.01
+UPDATE_BATCH_MAX_SIZE = 256
+CLIENT_QUEUE_MAX_SIZE = 1000
+
+GRPC_SERVER_OPTIONS = [
+    ("grpc.keepalive_time_ms", 20000),
+    ("grpc.keepalive_permit_without_calls", 1),
+    ("grpc.http2.max_pings_without_data", 0),
+    ("grpc.http2.min_time_between_pings_ms", 10000),
+    ("grpc.http2.min_ping_interval_without_data_ms", 10000), # Accept client keepalives at this rate
+    ("grpc.http2.bdp_probe", 1), # Let flow-control windows grow beyond the 64 KiB default
+    ("grpc.http2.write_buffer_size", 1 << 20),
+    ("grpc.max_concurrent_streams", 1000),
+    ("grpc.max_send_message_length", -1),
+    ("grpc.max_receive_message_length", -1),
+]
 MAX_ORDER_ID = 86400
 
 SIMULATED_INSTRUMENTS: List[str] = ["BTC_USD","ETH_USD","XRP_USD","LTC_USD","BCH_USD","SOL_USD","ADA_USD",\
@@ -21,23 +41,73 @@ SIMULATED_INSTRUMENTS: List[str] = ["BTC_USD","ETH_USD","XRP_USD","LTC_USD","BCH
                                     "AAVE_USD","SNX_USD"]
 
 
-_order_id_counter = 0
-_order_id_lock = threading.Lock()
+# Columns of the simulated order arena filled by _generate_orders
+ORDER_COL_PRICE, ORDER_COL_QUANTITY, ORDER_COL_SIDE, ORDER_COL_IS_LIMIT = range(4)
+# Columns of the per-tick uniform rolls consumed by _generate_orders
+ROLL_BRANCH, ROLL_COIN, ROLL_OFFSET, ROLL_ORDER_TYPE = range(4)
+ROLLS_PER_ORDER = 4
+# Cumulative probabilities of the pricing branches: at the touch (0.4), inside the
+# spread (0.6 * 0.7 = 0.42), outside the spread (the remaining 0.18)
+PRICE_BRANCH_AT_TOUCH, PRICE_BRANCH_INSIDE, PRICE_BRANCH_OUTSIDE = range(3)
+PRICE_BRANCH_CDF = np.array([0.4, 0.82, 1.0])
+
+@njit(cache=True)
+def _generate_orders(best_bid_price, best_ask_price, has_book, rolls, quantities, sides, out):
+    """
+    Fills each row of `out` with a simulated (price, quantity, side, is_limit) order placed
+    around the given top of book, driven by pre-drawn uniform `rolls`. Side and is_limit are
+    stored as 1.0/0.0.
+    """
+    # Pick every order's pricing branch with one lookup instead of chained probability checks
+    branches = np.searchsorted(PRICE_BRANCH_CDF, rolls[:, ROLL_BRANCH], side="right")
+    spread = best_ask_price - best_bid_price
+    for i in range(out.shape[0]):
+        roll = rolls[i]
+        if has_book:
+            branch = branches[i]
+            if branch == PRICE_BRANCH_AT_TOUCH:
+                price = best_ask_price if roll[ROLL_COIN] < 0.5 else best_bid_price
+            elif branch == PRICE_BRANCH_INSIDE:
+                offset = roll[ROLL_OFFSET] * spread
+                if roll[ROLL_COIN] < 0.5:
+                    price = round(best_bid_price + offset, 2)
+                else:
+                    price = round(best_ask_price - offset, 2)
+            else:
+                offset = 0.1 + roll[ROLL_OFFSET] * 0.4
+                if roll[ROLL_COIN] < 0.5:
+                    price = round(best_bid_price - offset, 2)
+                else:
+                    price = round(best_ask_price + offset, 2)
+
+            price = max(0.01, price)
+        else:
+            price = round(99.0 + roll[ROLL_OFFSET] * 2.0, 2)
+
+        out[i, ORDER_COL_PRICE] = price
+        out[i, ORDER_COL_QUANTITY] = quantities[i]
+        out[i, ORDER_COL_SIDE] = 1.0 if sides[i] else 0.0
+        out[i, ORDER_COL_IS_LIMIT] = 1.0 if roll[ROLL_ORDER_TYPE] < 0.8 else 0.0
+
+# next() on an itertools.count is atomic under the GIL, so simulation threads need no lock
+_order_id_counter = itertools.count(1)
 
 def get_next_order_id():
-    global _order_id_counter
-    with _order_id_lock:
-        _order_id_counter += 1
-        return _order_id_counter
+    return next(_order_id_counter)
 
 class MarketDataServicer(pb2_grpc.MarketDataServiceServicer):
     def __init__(self):
         self.order_books: dict[str, OrderBook] = {}
-        self.client_queues: defaultdict[str, list[asyncio.Queue]] = defaultdict(list)
-        self.lock = threading.Lock()
+        # Per instrument, an immutable tuple of (deque, Event) subscriber queues. Subscribe/unsubscribe
+        # swap in a new tuple on the event loop, so the fan-out can read it without locking.
+        self.client_queues: defaultdict[str, tuple[tuple[deque, asyncio.Event], ...]] = defaultdict(tuple)
+        # Serializes first-subscription setup per instrument (it awaits while the book is populated)
+        self.subscription_locks: defaultdict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
         self.simulation_threads: dict[str, threading.Thread] = {}
         self.running_simulations: dict[str, bool] = {}
         self.loop: Optional[asyncio.AbstractEventLoop] = None # Store reference to the event loop
+        # Updates posted by the simulation threads, drained in batches on the event loop
+        self.update_queue: queue.SimpleQueue = queue.SimpleQueue()
 
         # Initialize and start simulations for all instrumets
         for instrument_id in SIMULATED_INSTRUMENTS:
@@ -61,63 +131,100 @@ class MarketDataServicer(pb2_grpc.MarketDataServiceServicer):
             time.sleep(0.05) # small pause btwn simulation starting
         print("All inintial simulations have started")
 
-    # Async method to put response into queue
-    async def _put_response_into_queue(self, instrument_id: str, response: pb2.MarketDataResponse):
-        with self.lock:
-            for client_queue in self.client_queues[instrument_id]:
-                try:
-                    # Await for the put operation, but with a timeout to avoid blocking indefinitely
-                    # If you just use .put_nowait(), it can still fail silently if the queue is truly full
-                    await asyncio.wait_for(client_queue.put(response), timeout=0.1) 
-                except asyncio.QueueFull:
-                    print(f"Warning: Client queue for {instrument_id} full, dropping update (async)")
-                except asyncio.TimeoutError:
-                    print(f"Warning: Client queue for {instrument_id} put timed out, dropping update (async)")
-
-
-    def on_market_update_callback(self, instrument_id: str, price: float, quantity: int, side: bool, timestamp: float):
+    def _put_response_into_queue(self, instrument_id: str, response: pb2.MarketDataResponse):
+        """Runs on the event loop: appends the response to every subscriber queue and wakes its consumer."""
+        for client_queue, client_event in self.client_queues[instrument_id]:
+            if len(client_queue) == client_queue.maxlen:
+                print(f"Warning: Client queue for {instrument_id} full, dropping oldest update")
+            client_queue.append(response)
+            client_event.set()
+
+    def _flush_instrument_updates(self, instrument_id: str, updates: list):
+        """Sends a batch of (changes, timestamp) notifications to the instrument's subscribers as one response."""
+        # Build the updates in place inside the response; passing standalone OrderBookUpdate
+        # messages to the constructor would allocate each one and then copy it in.
+        # The single response object is shared by every subscriber queue.
+        # A failure here drops this batch only; the other instruments in the flush still go out
+        try:
+            response = pb2.MarketDataResponse()
+            add_update = response.batch.updates.add
+            for changes, timestamp in updates:
+                for price, quantity, side in changes:
+                    add_update(
+                        instrument_id=instrument_id,
+                        price=price,
+                        quantity=quantity,
+                        side=side,
+                        timestamp=timestamp
+                    )
+            self._put_response_into_queue(instrument_id, response)
+        except Exception as e:
+            print(f"Error sending update batch for {instrument_id}: {e}")
+
+    def _flush_pending_updates(self):
         """
-        This callback runs in the simulation thread (synchronous context).
-        It must safely submit an async task to the main event loop.
+        Periodic event loop callback: drains the notifications posted by the simulation threads and
+        sends them as one batch per instrument (or several, past UPDATE_BATCH_MAX_SIZE level updates).
         """
-        update_pb = pb2.OrderBookUpdate(
-            instrument_id=instrument_id,
-            price=price,
-            quantity=quantity,
-            side=side,
-            timestamp=timestamp
-        )
-        response = pb2.MarketDataResponse(update=update_pb)
+        # Always reschedule: an exception escaping a call_later callback would end the timer chain
+        # and with it all update fan-out, while update_queue keeps growing
+        try:
+            batches: dict[str, list] = {}
+            batch_sizes: dict[str, int] = {}
+            get_update = self.update_queue.get_nowait
+            # This is the only consumer, so at least qsize() items are available; anything posted
+            # meanwhile waits for the next flush.
+            for _ in range(self.update_queue.qsize()):
+                instrument_id, changes, timestamp = get_update()
+                batch = batches.get(instrument_id)
+                if batch is None:
+                    batch = batches[instrument_id] = []
+                    batch_sizes[instrument_id] = 0
+                batch.append((changes, timestamp))
+                batch_size = batch_sizes[instrument_id] + len(changes)
+                if batch_size >= UPDATE_BATCH_MAX_SIZE:
+                    self._flush_instrument_updates(instrument_id, batch)
+                    batches[instrument_id] = []
+                    batch_size = 0
+                batch_sizes[instrument_id] = batch_size
+
+            for instrument_id, batch in batches.items():
+                if batch:
+                    self._flush_instrument_updates(instrument_id, batch)
+        finally:
+            self.loop.call_later(UPDATE_FLUSH_INTERVAL_SECONDS, self._flush_pending_updates)
 
+    def on_market_update_callback(self, instrument_id: str, changes: list, timestamp: float):
+        """
+        This callback runs in the simulation thread (synchronous context), once per incoming order
+        with the (price, quantity, side) of every level it changed.
+        It posts the changes to a thread-safe queue that the event loop drains on its next flush,
+        so no per-update cross-thread scheduling is needed.
+        """
         if self.loop and self.loop.is_running():
-            try:
-                # Schedule the async coroutine to run on the main event loop
-                asyncio.run_coroutine_threadsafe(
-                    self._put_response_into_queue(instrument_id, response),
-                    self.loop
-                )
-            except Exception as e:
-                print(f"Error scheduling update for {instrument_id} on event loop: {e}")
+            self.update_queue.put_nowait((instrument_id, changes, timestamp))
         else:
             print(f"Warning: Event loop not running or not set, dropping update for {instrument_id}")
 
     def _simulate_market_data(self, instrument_id: str):
         print(f"Starting simulation for {instrument_id}...")
-        side_choices = [True, False]
+        rng = np.random.default_rng()
+        # Reused every tick to hold the generated orders
+        order_arena = np.empty((SIMULATION_ORDER_COUNT_PER_TICK, 4), dtype=np.float64)
 
         current_on_market_update = self.order_books[instrument_id].on_market_update
         self.order_books[instrument_id].on_market_update = None
 
         print(f"Populating initial order book for {instrument_id}...")
-        initial_price = round(random.uniform(50.0, 500.0),2)
+        initial_price = round(float(rng.uniform(50.0, 500.0)), 2)
         
         # Add initial bids (buy orders)
         for i in range(5):
             price = round(initial_price - (i * 0.1), 2)  # 100.0, 99.9, 99.8, 99.7, 99.6
-            quantity = random.randint(5, 20)
+            quantity = int(rng.integers(5, 21))
             order = Order(
                 order_id=get_next_order_id(),
-                price=price,
+                price=price_to_ticks(price),
                 quantity=quantity,
                 side=True,  # Buy
                 order_type="limit"
@@ -128,10 +235,10 @@ class MarketDataServicer(pb2_grpc.MarketDataServiceServicer):
         # Add initial asks (sell orders)
         for i in range(5):
             price = round(initial_price + 0.1 + (i * 0.1), 2)  # 100.1, 100.2, 100.3, 100.4, 100.5
-            quantity = random.randint(5, 20)
+            quantity = int(rng.integers(5, 21))
             order = Order(
                 order_id=get_next_order_id(),
-                price=price,
+                price=price_to_ticks(price),
                 quantity=quantity,
                 side=False,  # Sell
                 order_type="limit"
@@ -151,118 +258,137 @@ class MarketDataServicer(pb2_grpc.MarketDataServiceServicer):
         # Signal that initial population is complete (if you had a proper signalling mechanism)
         # For now, the time.sleep in SubscribeMarketData still serves this simple purpose.
 
-        # Continuous simulation
+        # Continuous simulation, paced against absolute deadlines so tick work doesn't add drift
+        next_tick = time.perf_counter()
         while self.running_simulations[instrument_id]:
             try:
-                for _ in range(SIMULATION_ORDER_COUNT_PER_TICK):
-                    current_book = self.order_books[instrument_id].dump_book()
-                    bids = current_book["bids"]
-                    asks = current_book["asks"]
-
-                    if bids and asks:
-                        best_bid_price = bids[0][0]
-                        best_ask_price = asks[0][0]
-                        
-                        if random.random() < 0.4:
-                            price = best_ask_price if random.random() < 0.5 else best_bid_price
-                        elif random.random() < 0.7:
-                            spread = best_ask_price - best_bid_price
-                            price = round(best_bid_price + random.uniform(0, spread), 2) if random.random() < 0.5 else round(best_ask_price - random.uniform(0, spread), 2)
-                        else:
-                            price = round(best_bid_price - random.uniform(0.1, 0.5), 2) if random.random() < 0.5 else round(best_ask_price + random.uniform(0.1, 0.5), 2)
-                        
-                        price = max(0.01, price)
-                    else:
-                        price = round(random.uniform(99.0, 101.0), 2)
-
-                    quantity = random.randint(1, 15)
-                    side = random.choice(side_choices)
-                    
-                    order_type = "limit" if random.random() < 0.8 else "market"
+                order_book = self.order_books[instrument_id]
+                best_bid = order_book.get_best_bid()
+                best_ask = order_book.get_best_ask()
+                has_book = best_bid is not None and best_ask is not None
+
+                # Draw the tick's randomness in one batch, then build the orders in compiled code
+                rolls = rng.random((SIMULATION_ORDER_COUNT_PER_TICK, ROLLS_PER_ORDER))
+                quantities = rng.integers(1, 16, SIMULATION_ORDER_COUNT_PER_TICK)
+                sides = rng.integers(0, 2, SIMULATION_ORDER_COUNT_PER_TICK, dtype=bool)
+                _generate_orders(
+                    best_bid.price / TICK_SIZE if has_book else 0.0,
+                    best_ask.price / TICK_SIZE if has_book else 0.0,
+                    has_book,
+                    rolls,
+                    quantities,
+                    sides,
+                    order_arena
+                )
 
+                for price, quantity, side, is_limit in order_arena:
                     order = Order(
                         order_id=get_next_order_id(),
-                        price=price,
-                        quantity=quantity,
-                        side=side,
-                        order_type=order_type
+                        price=price_to_ticks(price),
+                        quantity=int(quantity),
+                        side=bool(side),
+                        order_type="limit" if is_limit else "market"
                     )
-                    self.order_books[instrument_id].add_order(order)
-
-                time.sleep(SIMULATION_INTERVAL_SECONDS)
+                    order_book.add_order(order)
+
+                next_tick += SIMULATION_INTERVAL_SECONDS
+                delay = next_tick - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    # Fell behind; start a fresh schedule instead of bursting to catch up
+                    next_tick = time.perf_counter()
             except Exception as e:
                 print(f"Error in simulation loop for {instrument_id}: {e}")
                 time.sleep(1)
+                next_tick = time.perf_counter()
         
         print(f"Stopping simulation for {instrument_id}...")
 
     async def SubscribeMarketData(self, request: pb2.SubscriptionRequest, context: grpc.aio.ServicerContext):
-        instrument_id = request.instrument_id
-        client_queue = asyncio.Queue()
+        # De-duplicate while keeping the requested order
+        instrument_ids = list(dict.fromkeys(request.instrument_ids))
+        # One queue serves the whole subscription; it is registered under every requested instrument
+        client_queue: deque = deque(maxlen=CLIENT_QUEUE_MAX_SIZE)
+        client_event = asyncio.Event()
+        subscriber = (client_queue, client_event)
 
         # Set the event loop reference the first time it's needed
         if self.loop is None:
             self.loop = asyncio.get_running_loop() # Get the current event loop
+            self.loop.call_later(UPDATE_FLUSH_INTERVAL_SECONDS, self._flush_pending_updates)
 
-        with self.lock:
-            if instrument_id not in self.order_books:
-                print(f"First subscription for {instrument_id}. Creating OrderBook and starting simulation.")
-                self.order_books[instrument_id] = OrderBook(
-                    instrument_id=instrument_id,
-                    on_market_update=self.on_market_update_callback
-                )
-                self.running_simulations[instrument_id] = True
-                
-                simulation_thread = threading.Thread(
-                    target=self._simulate_market_data,
-                    args=(instrument_id,),
-                    daemon=True
-                )
-                simulation_thread.start()
-                self.simulation_threads[instrument_id] = simulation_thread
-                
-                time.sleep(0.2) # Give simulation a moment to populate initial book
-            
-            self.client_queues[instrument_id].append(client_queue)
-            print(f"Client subscribed to {instrument_id}. Total subscribers: {len(self.client_queues[instrument_id])}")
-
+        # Instruments this subscriber has been added to so far. Registration awaits (lock, first-time
+        # simulation start), so a cancellation can land part-way through; cleanup removes exactly these.
+        registered: List[str] = []
         try:
-            snapshot_data = self.order_books[instrument_id].dump_book()
-            # print(f"DEBUG: Sending snapshot with {len(snapshot_data['bids'])} bids and {len(snapshot_data['asks'])} asks") # Keep if needed for debug
-            
-            bids_pb = [pb2.OrderBookLevel(price=p, quantity=q) for p, q in snapshot_data["bids"]]
-            asks_pb = [pb2.OrderBookLevel(price=p, quantity=q) for p, q in snapshot_data["asks"]]
-
-            snapshot_pb = pb2.OrderBookSnapshot(
-                instrument_id=instrument_id,
-                bids=bids_pb,
-                asks=asks_pb,
-                timestamp=time.time()
-            )
-            initial_response = pb2.MarketDataResponse(snapshot=snapshot_pb)
-            yield initial_response
-
-            # Stream updates
+            for instrument_id in instrument_ids:
+                async with self.subscription_locks[instrument_id]:
+                    if instrument_id not in self.order_books:
+                        print(f"First subscription for {instrument_id}. Creating OrderBook and starting simulation.")
+                        self.order_books[instrument_id] = OrderBook(
+                            instrument_id=instrument_id,
+                            on_market_update=self.on_market_update_callback
+                        )
+                        self.running_simulations[instrument_id] = True
+
+                        simulation_thread = threading.Thread(
+                            target=self._simulate_market_data,
+                            args=(instrument_id,),
+                            daemon=True
+                        )
+                        simulation_thread.start()
+                        self.simulation_threads[instrument_id] = simulation_thread
+
+                        await asyncio.sleep(0.2) # Give simulation a moment to populate initial book
+
+                    self.client_queues[instrument_id] = self.client_queues[instrument_id] + (subscriber,)
+                    registered.append(instrument_id)
+                    print(f"Client subscribed to {instrument_id}. Total subscribers: {len(self.client_queues[instrument_id])}")
+
+            for instrument_id in instrument_ids:
+                snapshot_data = self.order_books[instrument_id].dump_book()
+                # print(f"DEBUG: Sending snapshot with {len(snapshot_data['bids'])} bids and {len(snapshot_data['asks'])} asks") # Keep if needed for debug
+
+                # Fill the levels in place with add() rather than building standalone
+                # OrderBookLevel messages that the constructor would then copy in
+                initial_response = pb2.MarketDataResponse()
+                snapshot_pb = initial_response.snapshot
+                snapshot_pb.instrument_id = instrument_id
+                snapshot_pb.timestamp = time.time()
+                add_bid = snapshot_pb.bids.add
+                for price, quantity in snapshot_data["bids"]:
+                    add_bid(price=price, quantity=quantity)
+                add_ask = snapshot_pb.asks.add
+                for price, quantity in snapshot_data["asks"]:
+                    add_ask(price=price, quantity=quantity)
+                yield initial_response
+
+            # Stream updates for all subscribed instruments
             while True:
-                response = await client_queue.get() # This should now receive updates
-                yield response
+                await client_event.wait()
+                client_event.clear()
+                while client_queue:
+                    yield client_queue.popleft()
 
         except grpc.RpcError as e:
-            print(f"Client for {instrument_id} disconnected or RPC error: {e}")
+            print(f"Client for {instrument_ids} disconnected or RPC error: {e}")
         except asyncio.CancelledError:
-            print(f"Client for {instrument_id} stream cancelled.")
+            print(f"Client for {instrument_ids} stream cancelled.")
         finally:
-            with self.lock:
-                if client_queue in self.client_queues[instrument_id]:
-                    self.client_queues[instrument_id].remove(client_queue)
+            # Nothing here awaits, so the tuple swaps cannot interleave with other subscribers
+            for instrument_id in registered:
+                self.client_queues[instrument_id] = tuple(
+                    entry for entry in self.client_queues[instrument_id] if entry is not subscriber
+                )
                 print(f"Client unsubscribed from {instrument_id}. Remaining subscribers: {len(self.client_queues[instrument_id])}")
-                
+
                 if not self.client_queues[instrument_id] and instrument_id in self.running_simulations:
                     print(f"No more subscribers for {instrument_id}. Stopping simulation.")
                     self.running_simulations[instrument_id] = False
 
 async def serve():
-    server = grpc.aio.server(concurrent.futures.ThreadPoolExecutor(max_workers=10))
+    server = grpc.aio.server(concurrent.futures.ThreadPoolExecutor(max_workers=10), options=GRPC_SERVER_OPTIONS)
     servicer_instance = MarketDataServicer()
     pb2_grpc.add_MarketDataServiceServicer_to_server(servicer_instance, server)
     server.add_insecure_port(SERVER_ADDRESS)
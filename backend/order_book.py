@@ -1,173 +1,261 @@
 #backend/order_book.py
 import time
 import heapq
+import logging
+import threading
+from collections import deque
 from dataclasses import dataclass, field
-from typing import List, Optional, Callable
+from itertools import islice
+from operator import neg
+from typing import Deque, Dict, List, Optional, Callable
 
-@dataclass
+import numpy as np
+from sortedcontainers import SortedDict
+
+logger = logging.getLogger(__name__)
+
+# Prices inside the book are integer ticks (e.g. cents): exact to compare, hash and aggregate.
+# Callers convert with price_to_ticks on the way in; dump_book and the market update callback
+# hand prices back out as floats.
+TICK_SIZE = 100
+
+def price_to_ticks(price: float) -> int:
+    return round(price * TICK_SIZE)
+
+# Executed trades are stored as rows of a structured array that doubles in size when full,
+# rather than as one Trade object per fill. Prices are in ticks, like the rest of the book.
+TRADE_DTYPE = np.dtype([('buy_id', 'i8'), ('sell_id', 'i8'), ('price', 'i8'), ('qty', 'i8'), ('ts', 'f8')])
+TRADE_LOG_INITIAL_CAPACITY = 1024
+
+@dataclass(slots=True)
 class Order:
     order_id: int
-    price: float
+    price: int      # in ticks, see TICK_SIZE
     quantity: int
     side: bool      # True for buy, False for sell
     order_type: str # "limit" or "market"
     timestamp: float = field(default_factory=time.time)
-    
-    def __lt__(self, other):
-        """Custom comparison for heap ordering"""
-        if self.side:  # Buy orders - higher price has priority (max heap behavior)
-            if self.price != other.price:
-                return self.price > other.price  # Higher price comes first
-            return self.timestamp < other.timestamp  # Earlier timestamp breaks ties
-        else:  # Sell orders - lower price has priority (min heap behavior)
-            if self.price != other.price:
-                return self.price < other.price  # Lower price comes first
-            return self.timestamp < other.timestamp  # Earlier timestamp breaks ties
-
-@dataclass
+    is_limit: bool = field(init=False) # order_type == "limit", decided once instead of per match step
+
+    def __post_init__(self):
+        self.is_limit = self.order_type == "limit"
+
+@dataclass(slots=True)
 class Trade:
     buy_order_id: int
     sell_order_id: int
-    price: float
+    price: int      # in ticks, see TICK_SIZE
     quantity: int
     timestamp: float = field(default_factory=time.time)
 
 class OrderBook:
+    """
+    Price-time priority book stored as a heap of price levels, each holding a FIFO queue of
+    resting orders. The heaps only contain prices (bids negated for max-heap behaviour), so
+    reaching the best order is a heap peek plus a dict lookup. Total resting quantity per
+    level is maintained alongside, sorted best-first, so dumping the book never rescans orders.
+    """
     def __init__(self, instrument_id: str, on_market_update: Optional[Callable] = None):
         self.instrument_id = instrument_id
-        self.buy_heap: List[Order] = []
-        self.sell_heap: List[Order] = []
-        self.trade_log: List[Trade] = []
+        self.bid_levels: Dict[int, Deque[Order]] = {}
+        self.ask_levels: Dict[int, Deque[Order]] = {}
+        self.bid_heap: List[int] = [] # -price of every price level in bid_levels
+        self.ask_heap: List[int] = [] # price of every price level in ask_levels
+        self.bid_levels_qty: SortedDict = SortedDict(neg) # price -> total quantity, highest first
+        self.ask_levels_qty: SortedDict = SortedDict()    # price -> total quantity, lowest first
+        self.trade_log: np.ndarray = np.empty(TRADE_LOG_INITIAL_CAPACITY, dtype=TRADE_DTYPE)
+        self.n_trades = 0 # rows of trade_log in use
         self.on_market_update = on_market_update
+        # add_order runs on a simulation thread while dump_book is called from the event loop;
+        # the SortedDict aggregates cannot be iterated while they are being mutated
+        self._lock = threading.Lock()
 
-    def _notify_update(self, price: float, quantity: int, side: bool):
-        """Internal helper to call the external update callback."""
-        if self.on_market_update:
-            self.on_market_update(self.instrument_id, price, quantity, side, time.time())
+    def _record_trade(self, buy_order_id: int, sell_order_id: int, price: int, quantity: int, timestamp: float):
+        n = self.n_trades
+        trade_log = self.trade_log
+        if n == len(trade_log):
+            grown = np.empty(2 * n, dtype=TRADE_DTYPE)
+            grown[:n] = trade_log
+            self.trade_log = trade_log = grown
+        trade_log[n] = (buy_order_id, sell_order_id, price, quantity, timestamp)
+        self.n_trades = n + 1
 
     def add_order(self, order: Order):
-        print(f"DEBUG: Adding order: ID={order.order_id}, Price={order.price}, Qty={order.quantity}, Side={'BUY' if order.side else 'SELL'}, Type={order.order_type}")
+        with self._lock:
+            self._add_order(order)
+
+    def _add_order(self, order: Order):
+        ts = time.time() # one timestamp for every trade this order produces
+        debug = logger.isEnabledFor(logging.DEBUG)
+        if debug:
+            logger.debug("Adding order: ID=%d, Price=%s, Qty=%d, Side=%s, Type=%s",
+                         order.order_id, order.price, order.quantity, "BUY" if order.side else "SELL", order.order_type)
 
         if order.side:  # Buy order
-            self._match_buy(order)
-            if order.quantity > 0 and order.order_type == "limit":
-                heapq.heappush(self.buy_heap, order)
-                print(f"DEBUG: Pushed buy limit order {order.order_id} to buy_heap. Current buy_heap size: {len(self.buy_heap)}")
-            else:
-                print(f"DEBUG: Buy order {order.order_id} not pushed to heap. Qty={order.quantity}, Type={order.order_type}")
+            touched = self._match_buy(order, ts)
+            changes = [(price / TICK_SIZE, qty, False) for price, qty in touched.items()]
+            if order.quantity > 0 and order.is_limit:
+                level = self.bid_levels.get(order.price)
+                if level is None:
+                    level = self.bid_levels[order.price] = deque()
+                    heapq.heappush(self.bid_heap, -order.price)
+                level.append(order)
+                level_qty = self.bid_levels_qty.get(order.price, 0) + order.quantity
+                self.bid_levels_qty[order.price] = level_qty
+                changes.append((order.price / TICK_SIZE, level_qty, True))
+                if debug:
+                    logger.debug("Rested buy limit order %d. Current bid levels: %d", order.order_id, len(self.bid_levels))
+            elif debug:
+                logger.debug("Buy order %d not rested. Qty=%d, Type=%s", order.order_id, order.quantity, order.order_type)
         else:  # Sell order
-            self._match_sell(order)
-            if order.quantity > 0 and order.order_type == "limit":
-                heapq.heappush(self.sell_heap, order)
-                print(f"DEBUG: Pushed sell limit order {order.order_id} to sell_heap. Current sell_heap size: {len(self.sell_heap)}")
-            else:
-                print(f"DEBUG: Sell order {order.order_id} not pushed to heap. Qty={order.quantity}, Type={order.order_type}")
-
-    def _match_buy(self, buy_order: Order):
-        while buy_order.quantity > 0 and self.sell_heap:
-            best_sell = self.sell_heap[0]
-            
-            # For limit orders, check price compatibility
-            if buy_order.order_type == "limit" and best_sell.price > buy_order.price:
+            touched = self._match_sell(order, ts)
+            changes = [(price / TICK_SIZE, qty, True) for price, qty in touched.items()]
+            if order.quantity > 0 and order.is_limit:
+                level = self.ask_levels.get(order.price)
+                if level is None:
+                    level = self.ask_levels[order.price] = deque()
+                    heapq.heappush(self.ask_heap, order.price)
+                level.append(order)
+                level_qty = self.ask_levels_qty.get(order.price, 0) + order.quantity
+                self.ask_levels_qty[order.price] = level_qty
+                changes.append((order.price / TICK_SIZE, level_qty, False))
+                if debug:
+                    logger.debug("Rested sell limit order %d. Current ask levels: %d", order.order_id, len(self.ask_levels))
+            elif debug:
+                logger.debug("Sell order %d not rested. Qty=%d, Type=%s", order.order_id, order.quantity, order.order_type)
+
+        # One notification per incoming order, however many levels it touched
+        if changes and self.on_market_update:
+            self.on_market_update(self.instrument_id, changes, ts)
+
+    def _match_buy(self, buy_order: Order, ts: float) -> Dict[int, int]:
+        debug = logger.isEnabledFor(logging.DEBUG)
+        # Market orders take any price; limit orders stop at their own price
+        check_price = buy_order.is_limit
+        limit_price = buy_order.price
+        touched: Dict[int, int] = {} # price -> new quantity of every level this order traded against
+        # Bind everything the loop touches to locals: each step then avoids global and attribute lookups
+        heap = self.ask_heap
+        levels = self.ask_levels
+        levels_qty = self.ask_levels_qty
+        record_trade = self._record_trade
+        heappop = heapq.heappop
+        _min = min
+        while buy_order.quantity > 0 and heap:
+            best_price = heap[0]
+
+            if check_price and best_price > limit_price:
                 break
-            
-            trade_qty = min(buy_order.quantity, best_sell.quantity)
-            trade_price = best_sell.price
-            
-            # Create trade
-            trade = Trade(
-                buy_order_id=buy_order.order_id,
-                sell_order_id=best_sell.order_id,
-                price=trade_price,
-                quantity=trade_qty
-            )
-            self.trade_log.append(trade)
-            
+
+            level = levels[best_price]
+            best_sell = level[0]
+            trade_qty = _min(buy_order.quantity, best_sell.quantity)
+            trade_price = best_price
+
+            record_trade(buy_order.order_id, best_sell.order_id, trade_price, trade_qty, ts)
+
             # Update quantities
             buy_order.quantity -= trade_qty
             best_sell.quantity -= trade_qty
-            
-            print(f"DEBUG: Trade executed - Buy:{buy_order.order_id} Sell:{best_sell.order_id} Price:{trade_price} Qty:{trade_qty}")
-            
+
+            level_qty = levels_qty[best_price] - trade_qty
+
+            if debug:
+                logger.debug("Trade executed - Buy:%d Sell:%d Price:%s Qty:%d",
+                             buy_order.order_id, best_sell.order_id, trade_price, trade_qty)
+
             # Handle sell order after trade
             if best_sell.quantity == 0:
-                heapq.heappop(self.sell_heap)
-                self._notify_update(best_sell.price, 0, False)  # Notify level removed
-                print(f"DEBUG: Sell order {best_sell.order_id} fully filled and removed from heap")
+                level.popleft()
+                if not level:
+                    heappop(heap)
+                    del levels[best_price]
+                if debug:
+                    logger.debug("Sell order %d fully filled and removed from book", best_sell.order_id)
+
+            if level_qty:
+                levels_qty[best_price] = level_qty
             else:
-                self._notify_update(best_sell.price, best_sell.quantity, False)  # Notify quantity change
-
-    def _match_sell(self, sell_order: Order):
-        while sell_order.quantity > 0 and self.buy_heap:
-            best_buy = self.buy_heap[0]
-            
-            # For limit orders, check price compatibility
-            if sell_order.order_type == "limit" and best_buy.price < sell_order.price:
+                del levels_qty[best_price]
+            touched[best_price] = level_qty  # New level quantity (0 = level removed)
+
+        return touched
+
+    def _match_sell(self, sell_order: Order, ts: float) -> Dict[int, int]:
+        debug = logger.isEnabledFor(logging.DEBUG)
+        # Market orders take any price; limit orders stop at their own price
+        check_price = sell_order.is_limit
+        limit_price = sell_order.price
+        touched: Dict[int, int] = {} # price -> new quantity of every level this order traded against
+        # Bind everything the loop touches to locals: each step then avoids global and attribute lookups
+        heap = self.bid_heap
+        levels = self.bid_levels
+        levels_qty = self.bid_levels_qty
+        record_trade = self._record_trade
+        heappop = heapq.heappop
+        _min = min
+        while sell_order.quantity > 0 and heap:
+            best_price = -heap[0]
+
+            if check_price and best_price < limit_price:
                 break
-            
-            trade_qty = min(sell_order.quantity, best_buy.quantity)
-            trade_price = best_buy.price
-            
-            # Create trade
-            trade = Trade(
-                buy_order_id=best_buy.order_id,
-                sell_order_id=sell_order.order_id,
-                price=trade_price,
-                quantity=trade_qty
-            )
-            self.trade_log.append(trade)
-            
+
+            level = levels[best_price]
+            best_buy = level[0]
+            trade_qty = _min(sell_order.quantity, best_buy.quantity)
+            trade_price = best_price
+
+            record_trade(best_buy.order_id, sell_order.order_id, trade_price, trade_qty, ts)
+
             # Update quantities
             sell_order.quantity -= trade_qty
             best_buy.quantity -= trade_qty
-            
-            print(f"DEBUG: Trade executed - Buy:{best_buy.order_id} Sell:{sell_order.order_id} Price:{trade_price} Qty:{trade_qty}")
-            
+
+            level_qty = levels_qty[best_price] - trade_qty
+
+            if debug:
+                logger.debug("Trade executed - Buy:%d Sell:%d Price:%s Qty:%d",
+                             best_buy.order_id, sell_order.order_id, trade_price, trade_qty)
+
             # Handle buy order after trade
             if best_buy.quantity == 0:
-                heapq.heappop(self.buy_heap)
-                self._notify_update(best_buy.price, 0, True)  # Notify level removed
-                print(f"DEBUG: Buy order {best_buy.order_id} fully filled and removed from heap")
+                level.popleft()
+                if not level:
+                    heappop(heap)
+                    del levels[best_price]
+                if debug:
+                    logger.debug("Buy order %d fully filled and removed from book", best_buy.order_id)
+
+            if level_qty:
+                levels_qty[best_price] = level_qty
             else:
-                self._notify_update(best_buy.price, best_buy.quantity, True)  # Notify quantity change
+                del levels_qty[best_price]
+            touched[best_price] = level_qty  # New level quantity (0 = level removed)
+
+        return touched
 
     def get_best_bid(self) -> Optional[Order]:
-        return self.buy_heap[0] if self.buy_heap else None
+        return self.bid_levels[-self.bid_heap[0]][0] if self.bid_heap else None
 
     def get_best_ask(self) -> Optional[Order]:
-        return self.sell_heap[0] if self.sell_heap else None
-
-    def get_trade_log(self) -> List[Trade]:
-        return self.trade_log
-
-    def dump_book(self) -> dict:
-        print(f"DEBUG: dump_book called. Buy Heap size: {len(self.buy_heap)}, Sell Heap size: {len(self.sell_heap)}")
-        
-        # Aggregate orders by price level
-        buy_levels = {}
-        sell_levels = {}
-        
-        # Process buy orders
-        for order in self.buy_heap:
-            if order.price in buy_levels:
-                buy_levels[order.price] += order.quantity
-            else:
-                buy_levels[order.price] = order.quantity
-        
-        # Process sell orders
-        for order in self.sell_heap:
-            if order.price in sell_levels:
-                sell_levels[order.price] += order.quantity
-            else:
-                sell_levels[order.price] = order.quantity
-        
-        # Sort and format
-        bids = [(price, qty) for price, qty in sorted(buy_levels.items(), reverse=True)]
-        asks = [(price, qty) for price, qty in sorted(sell_levels.items())]
-        
-        print(f"DEBUG: Returning bids: {bids[:5]}")  # Show first 5 levels
-        print(f"DEBUG: Returning asks: {asks[:5]}")  # Show first 5 levels
-        
+        return self.ask_levels[self.ask_heap[0]][0] if self.ask_heap else None
+
+    def get_trade_log(self) -> np.ndarray:
+        """Returns the executed trades as a TRADE_DTYPE array, oldest first."""
+        return self.trade_log[:self.n_trades]
+
+    def dump_book(self, top_n: Optional[int] = None) -> dict:
+        """Returns the aggregated (price, quantity) levels per side, best first, optionally only the top N."""
+        # Prices leave the book as floats
+        with self._lock:
+            bids = [(price / TICK_SIZE, qty) for price, qty in islice(self.bid_levels_qty.items(), top_n)]
+            asks = [(price / TICK_SIZE, qty) for price, qty in islice(self.ask_levels_qty.items(), top_n)]
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("dump_book called. Bid levels: %d, Ask levels: %d", len(self.bid_levels_qty), len(self.ask_levels_qty))
+            logger.debug("Returning bids: %s", bids[:5])  # Show first 5 levels
+            logger.debug("Returning asks: %s", asks[:5])  # Show first 5 levels
+
         return {
             "bids": bids,
             "asks": asks
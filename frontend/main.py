@@ -6,12 +6,14 @@ from fastapi.templating import Jinja2Templates
 import asyncio
 import grpc.aio
 from collections import defaultdict
-import json
+import orjson
 import time
-from typing import Dict, List, Tuple, Optional, Any
+from typing import Dict, Set, Tuple, Optional, Any
 
 # IMPORT THE NEW ClientOrderBook from the model file
 from backend.market_data_model import ClientOrderBook # <--- NEW IMPORT
+# Same gRPC channel settings as the CLI client
+from backend.market_data_client import GRPC_CHANNEL_OPTIONS
 
 # Import generated protobuf files
 from backend.market_data_pb2_generated import market_data_pb2 as pb2
@@ -19,6 +21,11 @@ from backend.market_data_pb2_generated import market_data_pb2_grpc as pb2_grpc
 
 # --- Configuration ---
 SERVER_ADDRESS = 'localhost:50051' # Your gRPC server address
+# Delay before resubscribing after the server became unavailable, doubled per failed attempt
+GRPC_RECONNECT_INITIAL_BACKOFF_SECONDS = 1
+GRPC_RECONNECT_MAX_BACKOFF_SECONDS = 60
+# Book changes are coalesced: each instrument is broadcast at most this many times per second
+BROADCAST_HZ = 50
 # List of instruments to subscribe to from the gRPC server
 # Make sure this matches SIMULATED_INSTRUMENTS in your market_data_server.py
 INSTRUMENTS_TO_SUBSCRIBE = [
@@ -40,84 +47,140 @@ templates = Jinja2Templates(directory="frontend/templates")
 # {instrument_id: ClientOrderBook_instance}
 global_order_books: Dict[str, ClientOrderBook] = {}
 # Stores active WebSocket connections for broadcasting
-# {instrument_id: [WebSocket_connection_1, WebSocket_connection_2, ...]}
-active_websocket_connections: defaultdict[str, List[WebSocket]] = defaultdict(list)
+# {instrument_id: {WebSocket_connection_1, WebSocket_connection_2, ...}}
+active_websocket_connections: defaultdict[str, Set[WebSocket]] = defaultdict(set)
+# Last serialized book per instrument, reused until the book's version changes
+# {instrument_id: (ClientOrderBook.version, JSON bytes)}
+serialized_order_books: Dict[str, Tuple[int, bytes]] = {}
+# Set whenever an instrument's book changed and has not been broadcast yet
+# {instrument_id: asyncio.Event}
+dirty_order_books: defaultdict[str, asyncio.Event] = defaultdict(asyncio.Event)
 
 
 # --- gRPC Subscription Task ---
 async def subscribe_to_grpc_market_data(instrument_id: str):
     """
     Subscribes to the gRPC server for a single instrument and updates global state.
-    Broadcasts updates via WebSockets.
+    Changes are marked dirty and sent to WebSockets by the instrument's broadcast_loop.
+    While the server is unavailable, the subscription is retried from this same task with
+    exponential backoff.
     """
     global_order_books[instrument_id] = ClientOrderBook(instrument_id)
+    dirty = dirty_order_books[instrument_id]
+    backoff = GRPC_RECONNECT_INITIAL_BACKOFF_SECONDS
     
-    async with grpc.aio.insecure_channel(SERVER_ADDRESS) as channel:
+    async with grpc.aio.insecure_channel(SERVER_ADDRESS, options=GRPC_CHANNEL_OPTIONS) as channel:
         stub = pb2_grpc.MarketDataServiceStub(channel)
-        print(f"FastAPI gRPC Client for {instrument_id}: Subscribing to market data...")
-        
-        request = pb2.SubscriptionRequest(instrument_id=instrument_id)
-        
-        try:
-            response_iterator = stub.SubscribeMarketData(request)
-            async for response in response_iterator:
-                if response.HasField('snapshot'):
-                    snapshot_data = response.snapshot
-                    global_order_books[instrument_id].apply_snapshot(snapshot_data)
-                    # When a snapshot arrives, also send the current full state to all connected websockets
-                    await broadcast_market_data(instrument_id)
-
-                elif response.HasField('update'):
-                    update_data = response.update
-                    global_order_books[instrument_id].apply_update(update_data)
-                    # After applying update, broadcast the updated full state
-                    await broadcast_market_data(instrument_id)
-
-        except grpc.aio.AioRpcError as e:
-            print(f"FastAPI gRPC Client for {instrument_id}: RPC Error occurred: {e.code()} - {e.details()}")
-            if e.code() == grpc.StatusCode.UNAVAILABLE:
-                print(f"FastAPI gRPC Client for {instrument_id}: Server is unavailable. Retrying in 5 seconds...")
-                await asyncio.sleep(5)
-                # Re-run the subscription task if disconnected
-                asyncio.create_task(subscribe_to_grpc_market_data(instrument_id)) 
-            else:
-                print(f"FastAPI gRPC Client for {instrument_id}: An unexpected gRPC error occurred: {e}")
-        except asyncio.CancelledError:
-            print(f"FastAPI gRPC Client task for {instrument_id} was cancelled.")
-        except Exception as e:
-            print(f"FastAPI gRPC Client for {instrument_id}: An unexpected error occurred in gRPC stream: {e}")
+        request = pb2.SubscriptionRequest(instrument_ids=[instrument_id])
+
+        while True:
+            print(f"FastAPI gRPC Client for {instrument_id}: Subscribing to market data...")
+            try:
+                response_iterator = stub.SubscribeMarketData(request)
+                async for response in response_iterator:
+                    if response.HasField('snapshot'):
+                        snapshot_data = response.snapshot
+                        global_order_books[instrument_id].apply_snapshot(snapshot_data)
+                        # When a snapshot arrives, also send the current full state to all connected websockets
+                        dirty.set()
+                        # Subscribed successfully, so the next outage starts backing off from scratch
+                        backoff = GRPC_RECONNECT_INITIAL_BACKOFF_SECONDS
+
+                    elif response.HasField('update'):
+                        update_data = response.update
+                        global_order_books[instrument_id].apply_update(update_data)
+                        # After applying update, broadcast the updated full state
+                        dirty.set()
+
+                    elif response.HasField('batch'):
+                        for update_data in response.batch.updates:
+                            global_order_books[instrument_id].apply_update(update_data)
+                        # Broadcast once for the whole batch
+                        dirty.set()
+                return
+
+            except grpc.aio.AioRpcError as e:
+                print(f"FastAPI gRPC Client for {instrument_id}: RPC Error occurred: {e.code()} - {e.details()}")
+                if e.code() != grpc.StatusCode.UNAVAILABLE:
+                    print(f"FastAPI gRPC Client for {instrument_id}: An unexpected gRPC error occurred: {e}")
+                    return
+                print(f"FastAPI gRPC Client for {instrument_id}: Server is unavailable. Retrying in {backoff} seconds...")
+            except asyncio.CancelledError:
+                print(f"FastAPI gRPC Client task for {instrument_id} was cancelled.")
+                return
+            except Exception as e:
+                print(f"FastAPI gRPC Client for {instrument_id}: An unexpected error occurred in gRPC stream: {e}")
+                return
+
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, GRPC_RECONNECT_MAX_BACKOFF_SECONDS)
+
+def serialize_order_book(instrument_id: str) -> bytes:
+    """
+    Returns the JSON for an instrument's current order book, serializing it only when the
+    book has changed since the last call.
+    """
+    order_book = global_order_books[instrument_id]
+    cached = serialized_order_books.get(instrument_id)
+    if cached is not None and cached[0] == order_book.version:
+        return cached[1]
+    message = orjson.dumps(order_book.to_dict())
+    serialized_order_books[instrument_id] = (order_book.version, message)
+    return message
 
 async def broadcast_market_data(instrument_id: str):
     """
     Sends the current order book state for an instrument to all connected WebSockets
     subscribed to that instrument.
     """
-    if instrument_id in global_order_books:
-        current_book_data = global_order_books[instrument_id].to_dict()
-        message = json.dumps(current_book_data)
-        
-        # Iterate over a copy of the list, as it might be modified during iteration
-        for connection in list(active_websocket_connections[instrument_id]):
-            try:
-                await connection.send_text(message)
-            except WebSocketDisconnect:
+    connections = active_websocket_connections[instrument_id]
+    if instrument_id in global_order_books and connections:
+        message = serialize_order_book(instrument_id)
+
+        # Send to every client concurrently so one slow connection doesn't hold up the rest.
+        # Work on a copy of the set, as it might be modified while the sends are in flight.
+        targets = list(connections)
+        results = await asyncio.gather(
+            *(connection.send_bytes(message) for connection in targets),
+            return_exceptions=True
+        )
+        for connection, result in zip(targets, results):
+            if not isinstance(result, Exception):
+                continue
+            if isinstance(result, WebSocketDisconnect):
                 print(f"WebSocket client for {instrument_id} disconnected during broadcast.")
-                active_websocket_connections[instrument_id].remove(connection)
-            except Exception as e:
-                print(f"Error broadcasting to WebSocket for {instrument_id}: {e}")
-                active_websocket_connections[instrument_id].remove(connection)
+            else:
+                print(f"Error broadcasting to WebSocket for {instrument_id}: {result}")
+            connections.discard(connection)
+
+
+async def broadcast_loop(instrument_id: str):
+    """
+    Broadcasts an instrument's latest order book whenever it has changed, at most BROADCAST_HZ
+    times per second. Updates arriving in between are folded into the next broadcast.
+    """
+    dirty = dirty_order_books[instrument_id]
+    interval = 1 / BROADCAST_HZ
+    try:
+        while True:
+            await dirty.wait()
+            dirty.clear()
+            await broadcast_market_data(instrument_id)
+            await asyncio.sleep(interval)
+    except asyncio.CancelledError:
+        print(f"Broadcast task for {instrument_id} was cancelled.")
 
 
 # --- FastAPI Lifecycle Events ---
 @app.on_event("startup")
 async def startup_event():
     """
-    On FastAPI startup, kick off the background gRPC client tasks for all instruments.
+    On FastAPI startup, kick off the background gRPC client and broadcast tasks for all instruments.
     """
     print("FastAPI application startup: Starting gRPC subscriptions...")
     for instrument_id in INSTRUMENTS_TO_SUBSCRIBE:
         asyncio.create_task(subscribe_to_grpc_market_data(instrument_id))
-        await asyncio.sleep(0.1) 
+        asyncio.create_task(broadcast_loop(instrument_id))
     print("FastAPI application startup: gRPC subscription tasks initiated.")
 
 @app.on_event("shutdown")
@@ -127,7 +190,8 @@ async def shutdown_event():
     """
     print("FastAPI application shutdown: Closing all WebSocket connections.")
     for instrument_id in active_websocket_connections:
-        for connection in active_websocket_connections[instrument_id]:
+        # Copy, since each closing endpoint removes itself from the set
+        for connection in list(active_websocket_connections[instrument_id]):
             try:
                 await connection.close()
             except RuntimeError: # Already closed
@@ -152,16 +216,16 @@ async def websocket_endpoint(websocket: WebSocket, instrument_id: str):
     await websocket.accept()
     print(f"WebSocket client connected for {instrument_id}")
 
-    active_websocket_connections[instrument_id].append(websocket)
+    active_websocket_connections[instrument_id].add(websocket)
 
     try:
         # Send initial snapshot immediately upon connection
         if instrument_id in global_order_books:
-            initial_data = global_order_books[instrument_id].to_dict()
-            await websocket.send_text(json.dumps(initial_data))
+            # Reuses the cached serialization when the book hasn't changed since the last broadcast
+            await websocket.send_bytes(serialize_order_book(instrument_id))
             print(f"Sent initial snapshot for {instrument_id} to new WebSocket client.")
         else:
-            await websocket.send_text(json.dumps({"error": f"No data yet for {instrument_id}"}))
+            await websocket.send_bytes(orjson.dumps({"error": f"No data yet for {instrument_id}"}))
 
         while True:
             # We don't expect messages *from* the client for market data display,
@@ -174,5 +238,4 @@ async def websocket_endpoint(websocket: WebSocket, instrument_id: str):
     except Exception as e:
         print(f"WebSocket error for {instrument_id}: {e}")
     finally:
-        if websocket in active_websocket_connections[instrument_id]:
-            active_websocket_connections[instrument_id].remove(websocket)
\ No newline at end of file
+        active_websocket_connections[instrument_id].discard(websocket)
\ No newline at end of file
@@ -17,6 +17,7 @@ document.addEventListener('DOMContentLoaded', () => {
 
     // Object to hold WebSocket connections
     const activeWebsockets = {};
+    const textDecoder = new TextDecoder();
 
     // Function to create or update an order book display for a single instrument
     function updateOrderBookDisplay(data) {
@@ -81,6 +82,7 @@ document.addEventListener('DOMContentLoaded', () => {
     // Function to establish a WebSocket connection for a given instrument
     function connectWebSocket(instrumentId) {
         const ws = new WebSocket(`ws://localhost:8000/ws/market_data/${instrumentId}`);
+        ws.binaryType = "arraybuffer"; // Book updates arrive as binary frames of UTF-8 JSON
         activeWebsockets[instrumentId] = ws;
 
         ws.onopen = (event) => {
@@ -89,7 +91,8 @@ document.addEventListener('DOMContentLoaded', () => {
 
         ws.onmessage = (event) => {
             try {
-                const data = JSON.parse(event.data);
+                const text = typeof event.data === "string" ? event.data : textDecoder.decode(event.data);
+                const data = JSON.parse(text);
                 // console.log(`Received data for ${instrumentId}:`, data); // For debugging
                 updateOrderBookDisplay(data);
             } catch (e) {